@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+
+from gemini import plan_batch_answers, answer_single_question
+from scheduler import scheduler
+from task_engine import SnippetWorker
+
+QUESTION_TIMEOUT = float(os.getenv("BATCH_QUESTION_TIMEOUT", "120"))
+
+
+async def answer_in_batch(question_text, request_folder, request_id, priority, progress, timeout=QUESTION_TIMEOUT):
+    """Answer each extracted question with its own snippet against one shared DataFrame.
+
+    The dataset is read once by a SnippetWorker; every sub-question gets an
+    LLM-generated snippet that runs concurrently in a child of that worker
+    under a per-question timeout, and is killed when the timeout expires.
+    Answers are merged into the planned format (array or object) with None for
+    questions that failed, so one bad snippet no longer sinks the whole
+    result.json.
+
+    Returns (content, ok, report), or None when batch mode does not apply and
+    the caller should fall back to the single-script flow.
+    """
+    data_path = os.path.join(request_folder, "data.csv")
+    if not os.path.exists(data_path):
+        print(f"WARNING: {data_path} not found, batch mode unavailable")
+        return None
+
+    progress("llm", "Splitting questions")
+    async with scheduler.slot("llm", request_id, priority):
+        plan = await plan_batch_answers(question_text, folder=request_folder)
+    if not plan:
+        return None
+    questions = [item for item in plan["questions"] if isinstance(item, dict) and item.get("question")]
+    if not questions:
+        print("WARNING: batch plan has no usable questions, batch mode unavailable")
+        return None
+
+    # Load the dataset once in the shared worker; snippets get copies of it
+    progress("exec", "Loading dataset")
+    worker = SnippetWorker(data_path, request_folder, owner=request_id, priority=priority)
+    try:
+        await worker.start()
+    except Exception as e:
+        print(f"WARNING: could not load {data_path} for batch mode: {e}")
+        return None
+
+    metadata_path = os.path.join(request_folder, "metadata.txt")
+    metadata = "No metadata available"
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r") as file:
+            metadata = file.read()
+
+    async def solve(item):
+        async with scheduler.slot("llm", request_id, priority):
+            snippet = await answer_single_question(item["question"], metadata, folder=request_folder)
+        if snippet is None:
+            return {"code": 0, "output": "❌ Could not generate code for this question"}
+        return await worker.run(snippet["code"], snippet["libraries"])
+
+    # Bound this request's fan-out to the LLM pool so one big batch queues
+    # behind its own semaphore instead of flooding the shared stage queues
+    fan_out = asyncio.Semaphore(scheduler.pools["llm"].slots)
+
+    async def solve_with_timeout(item):
+        async with fan_out:
+            # The per-question timeout starts once the question is actually running
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(solve(item), timeout)
+            except asyncio.TimeoutError:
+                result = {"code": 0, "output": f"❌ Timed out after {timeout}s"}
+            except Exception as e:
+                result = {"code": 0, "output": f"❌ {str(e)}"}
+        progress("exec", f"Question {item.get('key', '?')} {'answered' if result['code'] == 1 else 'failed'}")
+        result["seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+    progress("llm", f"Answering {len(questions)} questions in parallel")
+    try:
+        results = await asyncio.gather(*(solve_with_timeout(item) for item in questions))
+    finally:
+        await worker.close()
+
+    answers = [r["output"] if r["code"] == 1 else None for r in results]
+    if plan["format"] == "array":
+        content = answers
+    else:
+        content = {str(item.get("key", i + 1)): answer for i, (item, answer) in enumerate(zip(questions, answers))}
+
+    report = {
+        str(item.get("key", i + 1)): {
+            "ok": r["code"] == 1,
+            "seconds": r["seconds"],
+            "error": None if r["code"] == 1 else str(r["output"]),
+        }
+        for i, (item, r) in enumerate(zip(questions, results))
+    }
+
+    with open(os.path.join(request_folder, "result.json"), "w") as f:
+        json.dump(content, f)
+    with open(os.path.join(request_folder, "batch_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    return content, any(r["code"] == 1 for r in results), report
@@ -0,0 +1,131 @@
+"""Benchmark single-script vs batch answering on multi-question fixtures.
+
+Start the app (uvicorn main:app) and run:
+
+    python benchmark.py --url http://localhost:8000/api --repeat 3 --concurrency 2
+
+Each fixture in bench_fixtures/<name>/ has a questions.txt, its data files and
+a fixture.json describing the expected answer format. Both modes are scored
+the same way: a question counts as answered when its slot in the response
+(array position or object key) is present and not null.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+
+
+def load_fixtures(fixture_dir):
+    fixtures = []
+    for name in sorted(os.listdir(fixture_dir)):
+        folder = os.path.join(fixture_dir, name)
+        spec_path = os.path.join(folder, "fixture.json")
+        if not os.path.isfile(spec_path):
+            continue
+        with open(spec_path, "r") as f:
+            spec = json.load(f)
+        files = [file for file in sorted(os.listdir(folder)) if file != "fixture.json"]
+        fixtures.append({"name": name, "folder": folder, "spec": spec, "files": files})
+    return fixtures
+
+
+def score(spec, data):
+    """Return (questions, answered) for one response"""
+    if spec["format"] == "array":
+        total = spec["count"]
+        if not isinstance(data, list):
+            return total, 0
+        return total, sum(1 for value in data[:total] if value is not None)
+    keys = spec["keys"]
+    if not isinstance(data, dict):
+        return len(keys), 0
+    return len(keys), sum(1 for key in keys if data.get(key) is not None)
+
+
+async def run_fixture(client, url, mode, fixture):
+    files = []
+    for name in fixture["files"]:
+        with open(os.path.join(fixture["folder"], name), "rb") as f:
+            files.append((name, (name, f.read())))
+
+    started = time.monotonic()
+    try:
+        response = await client.post(url, files=files, headers={"X-Answer-Mode": mode})
+        status = response.status_code
+        data = response.json()
+    except Exception as e:
+        status, data = None, {"message": str(e)}
+    seconds = time.monotonic() - started
+
+    questions, answered = score(fixture["spec"], data)
+    return {"fixture": fixture["name"], "status": status, "seconds": seconds, "questions": questions, "answered": answered}
+
+
+async def run_mode(url, mode, fixtures, repeat, concurrency, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(client, fixture):
+        async with semaphore:
+            return await run_fixture(client, url, mode, fixture)
+
+    started = time.monotonic()
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        results = await asyncio.gather(*(limited(client, fixture) for fixture in fixtures * repeat))
+    return results, time.monotonic() - started
+
+
+def summarize(mode, results, wall_seconds):
+    latencies = sorted(r["seconds"] for r in results)
+    questions = sum(r["questions"] for r in results)
+    answered = sum(r["answered"] for r in results)
+    return {
+        "mode": mode,
+        "runs": len(results),
+        "complete_runs": sum(1 for r in results if r["answered"] == r["questions"]),
+        "rejected": sum(1 for r in results if r["status"] == 429),
+        "questions": questions,
+        "answered": answered,
+        "success_rate": round(answered / questions, 4) if questions else 0.0,
+        "answered_per_second": round(answered / wall_seconds, 4) if wall_seconds else 0.0,
+        "mean_seconds": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p95_seconds": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3) if latencies else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api")
+    parser.add_argument("--modes", default="single,batch")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    report = {"summary": [], "runs": {}}
+    for mode in args.modes.split(","):
+        results, wall_seconds = await run_mode(args.url, mode, fixtures, args.repeat, args.concurrency, args.timeout)
+        report["summary"].append(summarize(mode, results, wall_seconds))
+        report["runs"][mode] = results
+
+    for row in report["summary"]:
+        print(
+            f"{row['mode']:>6}: {row['answered']}/{row['questions']} answered "
+            f"({row['success_rate']:.0%}), {row['complete_runs']}/{row['runs']} complete runs, "
+            f"{row['answered_per_second']} answers/s, mean {row['mean_seconds']}s, p95 {row['p95_seconds']}s"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
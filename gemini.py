@@ -174,7 +174,7 @@ Remember: Return ONLY valid JSON, no explanations or comments outside the JSON.
 
     try:
         model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content(
+        response = await model.generate_content_async(
             [SYSTEM_PROMPT, user_prompt],
             generation_config=genai.types.GenerationConfig(
                 response_mime_type="application/json"
@@ -263,7 +263,7 @@ Return ONLY valid JSON, no explanations.
         model = genai.GenerativeModel(MODEL_NAME)
         system_prompt2 = SYSTEM_PROMPT2.format(folder=folder)
         
-        response = model.generate_content(
+        response = await model.generate_content_async(
             [system_prompt2, user_prompt],
             generation_config=genai.types.GenerationConfig(
                 response_mime_type="application/json"
@@ -296,3 +296,112 @@ print("Analysis failed, created error result")
 """,
             "libraries": ["json"]
         }
+
+SYSTEM_PROMPT3 = """
+You are a data analysis planner.
+Your job is to split the user's request into independent questions and describe the required answer format.
+
+Do not include explanations, comments, or extra text outside the JSON.
+"""
+
+async def plan_batch_answers(question_text, folder="uploads"):
+    """Split a multi-question request into sub-questions plus the answer format to merge them into"""
+    try:
+        metadata_path = os.path.join(folder, "metadata.txt")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r") as file:
+                metadata = file.read()
+        else:
+            metadata = "No metadata available"
+
+        user_prompt = f"""
+Question: {question_text}
+Metadata: {metadata}
+
+Return a JSON with:
+1. The 'format' field — "array" if the answers must be returned as a JSON array in question order, otherwise "object".
+2. The 'questions' field — one entry per question with:
+   - 'key': the exact key the answer must use in the JSON object (use the question number for arrays)
+   - 'question': the full question text, including any answer format details for that question
+
+{{
+  "format": "array",
+  "questions": [{{"key": "1", "question": "<question text>"}}]
+}}
+
+Return ONLY valid JSON, no explanations.
+"""
+
+        model = genai.GenerativeModel(MODEL_NAME)
+        response = await model.generate_content_async(
+            [SYSTEM_PROMPT3, user_prompt],
+            generation_config=genai.types.GenerationConfig(
+                response_mime_type="application/json"
+            )
+        )
+
+        result = safe_json_parse(response.text)
+
+        if not isinstance(result, dict) or not isinstance(result.get("questions"), list):
+            raise ValueError("Response has no questions list")
+        if result.get("format") not in ("array", "object"):
+            result["format"] = "object"
+
+        return result
+
+    except Exception as e:
+        print(f"ERROR in plan_batch_answers: {str(e)}")
+        return None
+
+SYSTEM_PROMPT4 = """
+You are a data analysis assistant.
+Your job is to write a short Python snippet that answers exactly one question about an already loaded pandas DataFrame.
+
+Do not include explanations, comments, or extra text outside the JSON.
+"""
+
+async def answer_single_question(question, metadata, folder="uploads"):
+    """Generate a snippet that answers one question against the shared `df`"""
+    try:
+        user_prompt = f"""
+Question: {question}
+Metadata: {metadata}
+
+The dataset from "{folder}/data.csv" is already loaded as a pandas DataFrame named `df`.
+`pd`, `np` and `folder` are also available. Do not reload the data.
+
+Return a JSON with:
+1. The 'code' field — Python code that stores the final answer in a variable named `answer`.
+2. The 'libraries' field — list of required pip install packages.
+3. Don't add libraries that come installed with Python like "io".
+4. If the answer is an image, build it with fig, ax = plt.subplots(), set `answer` to a base64 PNG data URI and close the figure.
+5. Do not write any files and do not print.
+
+{{
+  "code": "<Python code as string>",
+  "libraries": ["pandas"]
+}}
+
+Return ONLY valid JSON, no explanations.
+"""
+
+        model = genai.GenerativeModel(MODEL_NAME)
+        response = await model.generate_content_async(
+            [SYSTEM_PROMPT4, user_prompt],
+            generation_config=genai.types.GenerationConfig(
+                response_mime_type="application/json"
+            )
+        )
+
+        result = safe_json_parse(response.text)
+
+        if not isinstance(result, dict) or "code" not in result:
+            raise ValueError("Response has no code")
+        if "libraries" not in result:
+            result["libraries"] = []
+
+        return result
+
+    except Exception as e:
+        print(f"ERROR in answer_single_question: {str(e)}")
+        return None
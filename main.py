@@ -1,13 +1,15 @@
 from fastapi import FastAPI, Form, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import uuid
+import time
+import asyncio
 import aiofiles
-import json
 
-from task_engine import run_python_code
-from gemini import parse_question_with_llm, answer_with_data
+from pipeline import run_pipeline, answer_stats, resolve_answer_mode
+from scheduler import scheduler, SchedulerSaturated
+from web_results import result_cache, web_timings, render_head, render_progress, render_result, PAGE_TAIL
 
 app = FastAPI()
 
@@ -35,11 +37,36 @@ def ensure_upload_dir():
         print(f"Warning: Could not create upload directory: {e}")
         return "/tmp"
 
+def saturated_response(error):
+    """429 response telling the client when to retry"""
+    return JSONResponse(
+        {"message": "Server is busy, please retry later", "stage": error.stage},
+        status_code=429,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+# X-Priority comes from unauthenticated clients, so keep it to a small range
+MIN_PRIORITY = 0
+MAX_PRIORITY = 10
+
+def request_priority(request):
+    """Read optional X-Priority header, clamped to 0-10 (higher is served sooner)"""
+    try:
+        priority = int(request.headers.get("X-Priority", MIN_PRIORITY))
+    except ValueError:
+        return MIN_PRIORITY
+    return max(MIN_PRIORITY, min(MAX_PRIORITY, priority))
+
+def request_answer_mode(request):
+    """Read optional X-Answer-Mode header ("single" or "batch")"""
+    return request.headers.get("X-Answer-Mode", "").strip().lower() or None
+
 @app.post("/api")
 async def analyze(request: Request):
     # Create directory only when function is called
     base_upload_dir = ensure_upload_dir()
     request_id = str(uuid.uuid4())
+    priority = request_priority(request)
     request_folder = os.path.join(base_upload_dir, request_id)
     
     try:
@@ -81,51 +108,28 @@ async def analyze(request: Request):
     if not question_text:
         return JSONResponse({"message": "No question text provided"}, status_code=400)
 
+    # Admission control before any stage runs; run_pipeline releases it when done
     try:
-        # Get code steps from LLM
-        response = await parse_question_with_llm(
-            question_text=question_text,
-            uploaded_files=saved_files,
-            folder=request_folder
-        )
-
-        # Execute generated code safely
-        execution_result = await run_python_code(response["code"], response["libraries"], folder=request_folder)
-
-        count = 0
-        while execution_result["code"] == 0 and count < 3:
-            print(f"Error occurred while scraping x{count}")
-            new_question_text = str(question_text) + " previous time this error occurred " + str(execution_result["output"])
-            response = await parse_question_with_llm(
-                question_text=new_question_text,
-                uploaded_files=saved_files,
-                folder=request_folder
-            )
-            execution_result = await run_python_code(response["code"], response["libraries"], folder=request_folder)
-            count += 1
-
-        if execution_result["code"] != 1:
-            return JSONResponse({"message": "Error occurred while processing", "details": execution_result.get("output", "")})
-
-        # Get answers from LLM
-        gpt_ans = await answer_with_data(response["questions"], folder=request_folder)
-        final_result = await run_python_code(gpt_ans["code"], gpt_ans["libraries"], folder=request_folder)
-
-        # Handle final results
-        if final_result["code"] == 1:
-            result_path = os.path.join(request_folder, "result.json")
-            if os.path.exists(result_path):
-                with open(result_path, "r") as f:
-                    data = json.load(f)
-                return JSONResponse(content=data)
-            else:
-                return JSONResponse({"message": "Processing completed", "result": final_result["output"]})
-        else:
-            return JSONResponse({"message": "Failed to generate results", "details": final_result.get("output", "")})
+        scheduler.admit(request_id)
+    except SchedulerSaturated as e:
+        return saturated_response(e)
 
+    try:
+        content, _, _ = await run_pipeline(question_text, saved_files, request_folder, request_id, priority, mode=request_answer_mode(request))
+        return JSONResponse(content=content)
     except Exception as e:
         return JSONResponse({"message": f"API processing error: {str(e)}"}, status_code=500)
 
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Per-stage slot usage and queue-wait times (seconds) for tuning pool sizes"""
+    return scheduler.stats()
+
+@app.get("/api/stats")
+async def api_stats():
+    """Per-run outcomes (complete/partial/failed) and answering time of single-script vs batch answering"""
+    return answer_stats.stats()
+
 @app.get("/", response_class=HTMLResponse)
 async def web_interface():
     return """
@@ -142,6 +146,12 @@ async def web_interface():
         <form action="/web-api" method="post">
             <label for="question">Ask a question:</label><br>
             <textarea name="question" rows="4" cols="50" placeholder="What are the top 10 movies by box office?"></textarea><br>
+            <label for="mode">Answer mode:</label>
+            <select name="mode" id="mode">
+                <option value="">Server default</option>
+                <option value="single">Single script</option>
+                <option value="batch">Batch (one snippet per question)</option>
+            </select><br>
             <button type="submit">Analyze</button>
         </form>
     </body>
@@ -149,26 +159,85 @@ async def web_interface():
     """
 
 @app.post("/web-api")
-async def web_analyze(question: str = Form(...)):
-    """Web interface endpoint"""
-    base_upload_dir = ensure_upload_dir()
+async def web_analyze(request: Request, question: str = Form(...), mode: str = Form("")):
+    """Web interface endpoint: runs the /api pipeline and streams progress as HTML"""
+    started = time.monotonic()
+    # The form's mode field wins over the X-Answer-Mode header
+    mode = resolve_answer_mode(mode.strip().lower() or request_answer_mode(request))
+
+    # Repeated questions are answered straight from the rendered-result cache
+    cached = result_cache.get(question, mode)
+    if cached is not None:
+        web_timings.cached.append(time.monotonic() - started)
+        return HTMLResponse(render_head(question) + render_progress("Served from cache") + cached + PAGE_TAIL)
+
     request_id = str(uuid.uuid4())
+    try:
+        scheduler.admit(request_id)
+    except SchedulerSaturated as e:
+        busy = render_head(question) + render_result({"message": "Server is busy, please retry later"}, False) + PAGE_TAIL
+        return HTMLResponse(busy, status_code=429, headers={"Retry-After": str(e.retry_after)})
+
+    base_upload_dir = ensure_upload_dir()
+    priority = request_priority(request)
     request_folder = os.path.join(base_upload_dir, request_id)
-    
+
     try:
         os.makedirs(request_folder, exist_ok=True)
         question_file = os.path.join(request_folder, "questions.txt")
-        
+
         async with aiofiles.open(question_file, "w") as f:
             await f.write(question)
-        
-        return {"question": question, "status": "received", "message": "Question processed successfully"}
-        
     except Exception as e:
-        return {"question": question, "error": f"Processing error: {str(e)}"}
-
-
-
+        scheduler.finish(request_id)
+        failed = render_head(question) + render_result({"message": f"Processing error: {str(e)}"}, False) + PAGE_TAIL
+        return HTMLResponse(failed, status_code=500)
+
+    saved_files = {"questions.txt": question_file}
+    events = asyncio.Queue()
+
+    def progress(stage, message):
+        events.put_nowait(render_progress(message))
+
+    async def run():
+        try:
+            return await run_pipeline(question, saved_files, request_folder, request_id, priority, progress=progress, mode=mode)
+        except Exception as e:
+            return {"message": f"API processing error: {str(e)}"}, False, False
+        finally:
+            events.put_nowait(None)
+
+    async def stream():
+        web_timings.start()
+        task = asyncio.create_task(run())
+        try:
+            yield render_head(question) + render_progress("Queued for analysis")
+            web_timings.ttfb.append(time.monotonic() - started)
+
+            while (chunk := await events.get()) is not None:
+                yield chunk
+
+            content, ok, complete = await task
+            rendered = render_result(content, ok)
+            # Partial batch results (some questions null) are not worth serving again
+            if complete:
+                result_cache.put(question, mode, rendered)
+            yield rendered + PAGE_TAIL
+            web_timings.ttr.append(time.monotonic() - started)
+        finally:
+            # Browser went away mid-stream: stop spending slots on it
+            if not task.done():
+                task.cancel()
+            # Covers a stream closed before the pipeline task ever ran
+            scheduler.finish(request_id)
+            web_timings.finish()
+
+    return StreamingResponse(stream(), media_type="text/html")
+
+@app.get("/web-api/stats")
+async def web_stats():
+    """Time-to-first-byte / time-to-result of pipeline runs, cache-hit time (seconds) and cache stats for the web form"""
+    return {**web_timings.stats(), "cache": result_cache.stats()}
 
 
 # For local development
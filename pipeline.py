@@ -0,0 +1,135 @@
+import os
+import json
+import time
+
+from task_engine import run_python_code
+from gemini import parse_question_with_llm, answer_with_data
+from scheduler import scheduler
+from batch_answer import answer_in_batch
+
+ANSWER_MODES = ("single", "batch")
+DEFAULT_ANSWER_MODE = os.getenv("ANSWER_MODE", "single")
+
+
+class AnswerStats:
+    """Per answer-mode run outcomes and answering time, to compare single vs batch.
+
+    Counted per request in both modes: single mode has no per-question
+    breakdown, so per-question success/throughput comes from benchmark.py,
+    which scores both modes' responses the same way.
+    """
+
+    OUTCOMES = ("complete", "partial", "failed")
+
+    def __init__(self):
+        self.modes = {
+            mode: {"runs": 0, "complete": 0, "partial": 0, "failed": 0, "seconds": 0.0}
+            for mode in ANSWER_MODES
+        }
+
+    def record(self, mode, seconds, outcome):
+        stats = self.modes[mode]
+        stats["runs"] += 1
+        stats[outcome] += 1
+        stats["seconds"] += seconds
+
+    def stats(self):
+        summary = {}
+        for mode, stats in self.modes.items():
+            summary[mode] = {
+                **stats,
+                "seconds": round(stats["seconds"], 3),
+                "mean_seconds": round(stats["seconds"] / stats["runs"], 3) if stats["runs"] else 0.0,
+                "complete_rate": round(stats["complete"] / stats["runs"], 4) if stats["runs"] else 0.0,
+            }
+        return summary
+
+
+answer_stats = AnswerStats()
+
+
+def resolve_answer_mode(mode):
+    """Requested answer mode, or the ANSWER_MODE default when missing/unknown"""
+    return mode if mode in ANSWER_MODES else DEFAULT_ANSWER_MODE
+
+
+def _noop_progress(stage, message):
+    pass
+
+
+async def run_pipeline(question_text, saved_files, request_folder, request_id, priority=0, progress=None, mode=None):
+    """Scrape -> retry -> answer pipeline shared by /api and /web-api.
+
+    Returns (content, ok, complete) where content is the JSON payload for the
+    client, ok tells whether result.json was produced and complete whether
+    every question was answered (batch mode may return partial results, with
+    nulls for failed questions). progress(stage, message) is
+    called as each stage starts so callers can stream updates.
+    mode is "single" (one analysis script) or "batch" (per-question snippets,
+    see batch_answer); batch falls back to single when it does not apply.
+    The caller must have admitted request_id via scheduler.admit; it is
+    released here when the pipeline finishes.
+    """
+    progress = progress or _noop_progress
+    mode = resolve_answer_mode(mode)
+    try:
+        # Get code steps from LLM
+        progress("llm", "Planning data extraction")
+        async with scheduler.slot("llm", request_id, priority):
+            response = await parse_question_with_llm(
+                question_text=question_text,
+                uploaded_files=saved_files,
+                folder=request_folder
+            )
+
+        # Execute generated code safely
+        progress("exec", "Collecting data")
+        execution_result = await run_python_code(response["code"], response["libraries"], folder=request_folder, owner=request_id, priority=priority)
+
+        count = 0
+        while execution_result["code"] == 0 and count < 3:
+            print(f"Error occurred while scraping x{count}")
+            progress("llm", f"Data collection failed, retrying ({count + 1}/3)")
+            new_question_text = str(question_text) + " previous time this error occurred " + str(execution_result["output"])
+            async with scheduler.slot("llm", request_id, priority):
+                response = await parse_question_with_llm(
+                    question_text=new_question_text,
+                    uploaded_files=saved_files,
+                    folder=request_folder
+                )
+            execution_result = await run_python_code(response["code"], response["libraries"], folder=request_folder, owner=request_id, priority=priority)
+            count += 1
+
+        if execution_result["code"] != 1:
+            return {"message": "Error occurred while processing", "details": execution_result.get("output", "")}, False, False
+
+        answer_started = time.monotonic()
+        if mode == "batch":
+            batch = await answer_in_batch(question_text, request_folder, request_id, priority, progress=progress)
+            if batch is not None:
+                content, ok, report = batch
+                complete = all(entry["ok"] for entry in report.values())
+                answer_stats.record("batch", time.monotonic() - answer_started, "complete" if complete else "partial" if ok else "failed")
+                return content, ok, complete
+            progress("llm", "Batch mode unavailable, using a single analysis script")
+
+        # Get answers from LLM
+        progress("llm", "Writing analysis code")
+        async with scheduler.slot("llm", request_id, priority):
+            gpt_ans = await answer_with_data(response["questions"], folder=request_folder)
+        progress("exec", "Running analysis")
+        final_result = await run_python_code(gpt_ans["code"], gpt_ans["libraries"], folder=request_folder, owner=request_id, priority=priority)
+
+        # Handle final results; one failing question fails them all in this mode
+        ok = final_result["code"] == 1 and os.path.exists(os.path.join(request_folder, "result.json"))
+        answer_stats.record("single", time.monotonic() - answer_started, "complete" if ok else "failed")
+        if final_result["code"] == 1:
+            result_path = os.path.join(request_folder, "result.json")
+            if os.path.exists(result_path):
+                with open(result_path, "r") as f:
+                    return json.load(f), True, True
+            return {"message": "Processing completed", "result": final_result["output"]}, False, False
+        return {"message": "Failed to generate results", "details": final_result.get("output", "")}, False, False
+
+    finally:
+        scheduler.finish(request_id)
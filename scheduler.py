@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+
+class SchedulerSaturated(Exception):
+    """Raised by admission control when the request should be retried later"""
+
+    def __init__(self, stage, retry_after):
+        super().__init__(f"Stage '{stage}' is saturated, retry after {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StagePool:
+    """Bounded pool of slots for one stage type (llm, install, exec).
+
+    Waiters are ordered by priority first (higher runs sooner) and then by how
+    many slots their owning request has already been granted on this stage, so
+    one request with many LLM retries cannot starve the others. Acquiring never
+    fails: queue length is bounded by Scheduler.admit, not here.
+    """
+
+    def __init__(self, name, slots, max_queue, rate_per_minute=0):
+        self.name = name
+        self.slots = max(1, int(slots))
+        self.max_queue = max(0, int(max_queue))
+        self.min_interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self.in_use = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._granted = defaultdict(int)
+        self._next_start = 0.0
+        self._wait_times = deque(maxlen=500)
+        self._hold_times = deque(maxlen=100)
+
+    def queued(self):
+        return sum(1 for entry in self._waiters if not entry[-1].done())
+
+    def capacity(self):
+        """How many admitted requests this stage can hold running or queued"""
+        return self.slots + self.max_queue
+
+    def retry_after(self, backlog):
+        """Rough estimate of seconds until `backlog` queued holders clear"""
+        avg_hold = sum(self._hold_times) / len(self._hold_times) if self._hold_times else 5.0
+        return max(1, int(avg_hold * max(1, backlog) / self.slots + 0.5))
+
+    async def acquire(self, owner, priority=0):
+        start = time.monotonic()
+        if self.in_use < self.slots and not self.queued():
+            self.in_use += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (-priority, self._granted[owner], next(self._seq), future)
+            heapq.heappush(self._waiters, entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed to us just as we were cancelled
+                    self.release()
+                raise
+
+        # The slot is ours from here on; give it back if we are cancelled while throttled
+        try:
+            self._granted[owner] += 1
+            await self._throttle()
+        except BaseException:
+            self.release()
+            raise
+        self._wait_times.append(time.monotonic() - start)
+
+    async def _throttle(self):
+        """Space out slot starts to respect a provider requests-per-minute limit"""
+        if not self.min_interval:
+            return
+        # Only claim the interval once we are actually starting, so a waiter
+        # cancelled mid-sleep does not push back everyone after it
+        now = time.monotonic()
+        while now < self._next_start:
+            await asyncio.sleep(self._next_start - now)
+            now = time.monotonic()
+        self._next_start = now + self.min_interval
+
+    def release(self):
+        # Hand the slot straight to the next live waiter so in_use stays accurate
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[-1]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    def forget(self, owner):
+        self._granted.pop(owner, None)
+
+    def stats(self):
+        waits = sorted(self._wait_times)
+
+        def pct(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4)
+
+        return {
+            "slots": self.slots,
+            "in_use": self.in_use,
+            "queued": self.queued(),
+            "max_queue": self.max_queue,
+            "samples": len(waits),
+            "wait_p50": pct(0.50),
+            "wait_p95": pct(0.95),
+            "wait_max": round(waits[-1], 4) if waits else 0.0,
+        }
+
+
+def _default_exec_slots():
+    """One exec slot per CPU, capped by how many runs fit in physical memory"""
+    cpu_slots = os.cpu_count() or 1
+    per_exec_mb = int(os.getenv("SCHED_EXEC_MEMORY_MB", "512"))
+    try:
+        total_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+        mem_slots = max(1, total_mb // per_exec_mb)
+    except (ValueError, OSError, AttributeError):
+        mem_slots = cpu_slots
+    return min(cpu_slots, mem_slots)
+
+
+class Scheduler:
+    """Global per-stage scheduler shared by every request handled by this process"""
+
+    def __init__(self):
+        max_queue = int(os.getenv("SCHED_QUEUE_LIMIT", "32"))
+        self.pools = {
+            "llm": StagePool(
+                "llm",
+                int(os.getenv("SCHED_LLM_SLOTS", "4")),
+                max_queue,
+                rate_per_minute=int(os.getenv("SCHED_LLM_RPM", "60")),
+            ),
+            "install": StagePool("install", int(os.getenv("SCHED_INSTALL_SLOTS", "1")), max_queue),
+            "exec": StagePool("exec", int(os.getenv("SCHED_EXEC_SLOTS", str(_default_exec_slots()))), max_queue),
+        }
+        self._admitted = set()
+        self._rejected = 0
+
+    def admit(self, owner):
+        """Admission control at the door: reject a request that would overfill a stage.
+
+        Every admitted request passes through every stage, so each stage can
+        take at most slots + max_queue of them. Once admitted, a request's
+        slot() calls only ever wait; call finish() when it is done.
+        """
+        if owner in self._admitted:
+            return
+        pool = min(self.pools.values(), key=lambda pool: pool.capacity())
+        if len(self._admitted) >= pool.capacity():
+            self._rejected += 1
+            raise SchedulerSaturated(pool.name, pool.retry_after(len(self._admitted) - pool.slots + 1))
+        self._admitted.add(owner)
+
+    @asynccontextmanager
+    async def slot(self, stage, owner=None, priority=0):
+        pool = self.pools[stage]
+        await pool.acquire(owner, priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            pool._hold_times.append(time.monotonic() - start)
+            pool.release()
+
+    def finish(self, owner):
+        """Release a request's admission and drop its fairness counters"""
+        self._admitted.discard(owner)
+        for pool in self.pools.values():
+            pool.forget(owner)
+
+    def stats(self):
+        return {
+            "admission": {
+                "admitted": len(self._admitted),
+                "capacity": min(pool.capacity() for pool in self.pools.values()),
+                "rejected": self._rejected,
+            },
+            **{name: pool.stats() for name, pool in self.pools.items()},
+        }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,131 @@
+"""Shared dataset worker for batch answering.
+
+Run as `python snippet_worker.py <data.csv> <folder>`. The dataset is read once;
+each job line on stdin ({"id", "code"}) is run in a forked child that gets a
+copy-on-write view of the loaded DataFrame, so the server can kill a single
+runaway snippet without reloading the data for the others.
+
+Protocol on stdout (one JSON object per line):
+  {"ready": true}                      dataset loaded
+  {"id": ..., "pid": ...}              job started in child pid
+  {"id": ..., "done": true}            result written to <folder>/answers/<id>.json
+  {"id": ..., "done": true, "error": ...}  child died without reporting (signal,
+                                       OOM kill, exit before writing its answer)
+"""
+import json
+import math
+import os
+import select
+import sys
+import traceback
+
+
+def to_jsonable(value):
+    """Turn numpy/pandas values into plain JSON types; NaN/inf raise ValueError"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, "tolist"):
+        return to_jsonable(value.tolist())
+    if hasattr(value, "item"):
+        return to_jsonable(value.item())
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"Answer contains a non-finite number ({value})")
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def run_job(job, df, folder, protocol):
+    import numpy as np
+    import pandas as pd
+
+    exec_globals = {"df": df.copy(), "pd": pd, "np": np, "folder": folder}
+    try:
+        exec(job["code"], exec_globals)
+        if "answer" not in exec_globals:
+            result = {"code": 0, "output": "❌ Snippet did not set `answer`"}
+        else:
+            result = {"code": 1, "output": to_jsonable(exec_globals["answer"])}
+    except BaseException:
+        # Includes SystemExit / KeyboardInterrupt raised by the snippet itself
+        result = {"code": 0, "output": f"❌ Error during code execution:\n{traceback.format_exc()}"}
+
+    with open(os.path.join(folder, "answers", f"{job['id']}.json"), "w") as f:
+        json.dump(result, f)
+    protocol.write(json.dumps({"id": job["id"], "done": True}) + "\n")
+    protocol.flush()
+
+
+def report(event):
+    print(json.dumps(event), flush=True)
+
+
+def reap(children):
+    """Collect exited children; report the ones that died without sending done"""
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        job_id = children.pop(pid, None)
+        if job_id is None or (os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0):
+            continue
+        if os.WIFSIGNALED(status):
+            reason = f"Snippet process killed by signal {os.WTERMSIG(status)}"
+        else:
+            reason = f"Snippet process exited with status {os.WEXITSTATUS(status)}"
+        report({"id": job_id, "done": True, "error": reason})
+
+
+def start_job(job, df, folder):
+    pid = os.fork()
+    if pid == 0:
+        # Snippet output must not corrupt the protocol stream
+        protocol = os.fdopen(os.dup(1), "w")
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        # Exit status 0 means done was sent; anything else is reported by reap()
+        status = 1
+        try:
+            run_job(job, df, folder, protocol)
+            status = 0
+        finally:
+            os._exit(status)
+    return pid
+
+
+def main(data_path, folder):
+    import pandas as pd
+
+    df = pd.read_csv(data_path)
+    os.makedirs(os.path.join(folder, "answers"), exist_ok=True)
+    report({"ready": True})
+
+    # Poll stdin so exited children are reaped (and reported) promptly even
+    # while no new jobs arrive
+    children = {}
+    stdin = sys.stdin.fileno()
+    pending = b""
+    while True:
+        reap(children)
+        ready, _, _ = select.select([stdin], [], [], 0.1)
+        if not ready:
+            continue
+        chunk = os.read(stdin, 65536)
+        if not chunk:
+            break
+        pending += chunk
+        while b"\n" in pending:
+            line, pending = pending.split(b"\n", 1)
+            job = json.loads(line)
+            pid = start_job(job, df, folder)
+            children[pid] = job["id"]
+            report({"id": job["id"], "pid": pid})
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], sys.argv[2])
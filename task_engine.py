@@ -1,39 +1,208 @@
-import subprocess
+import asyncio
+import importlib.metadata
+import importlib.util
+import itertools
+import json
+import os
+import re
+import signal
 import sys
 import traceback
 from typing import List
 
+from scheduler import scheduler
 
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snippet_worker.py")
 
-async def run_python_code(code: str, libraries: List[str], folder: str = "uploads") -> dict:
-    import os
-    import io
 
-    def execute_code():
-        # Ensure working directory is the request folder
-        #os.makedirs(folder, exist_ok=True)
-        #old_cwd = os.getcwd()
-        #os.chdir(folder)
-        #try:
-        #    exec_globals = {}
-        #    exec(code, exec_globals)
-        #finally:
-        #    os.chdir(old_cwd)
 
-        exec_globals = {}
-        exec(code, exec_globals)
+async def _run_process(args, input_data=None):
+    """Run a child process; it is killed if the awaiting task is cancelled"""
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate(input_data)
+    except BaseException:
+        # Keep the caller's slot until the child is really gone
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
 
-    # Step 1: Install all required libraries first
-    for lib in libraries:
+
+def _is_installed(lib: str) -> bool:
+    """True when a bare requirement is already importable or installed as a distribution"""
+    if not re.fullmatch(r"[A-Za-z0-9._-]+", lib):
+        # Version specifiers / extras: let pip decide
+        return False
+    try:
+        importlib.metadata.distribution(lib)
+        return True
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    try:
+        # Import names and stdlib modules the LLM sometimes lists (e.g. "json")
+        return importlib.util.find_spec(lib) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+async def install_libraries(libraries: List[str], owner: str = None, priority: int = 0) -> dict:
+    """Install missing libraries one by one; returns an error result on failure, None on success"""
+    # Install slots avoid pip lock contention; skipping what is already there
+    # keeps batches from queueing one pip call per snippet
+    for lib in dict.fromkeys(lib.strip() for lib in libraries if lib.strip()):
+        if _is_installed(lib):
+            continue
         try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", lib])
+            async with scheduler.slot("install", owner, priority):
+                # Another request may have installed it while we waited
+                if _is_installed(lib):
+                    continue
+                install = asyncio.ensure_future(_run_process([sys.executable, "-m", "pip", "install", lib]))
+                try:
+                    returncode, _, stderr = await asyncio.shield(install)
+                except asyncio.CancelledError:
+                    # A killed pip can leave site-packages half-written for every
+                    # request, so let it finish (holding the slot) before giving up
+                    await asyncio.wait({install})
+                    raise
         except Exception as install_error:
             return {"code": 0, "output":f"❌ Failed to install library '{lib}':\n{install_error}"}
+        if returncode != 0:
+            return {"code": 0, "output":f"❌ Failed to install library '{lib}':\n{stderr}"}
+        importlib.invalidate_caches()
+    return None
+
+
+class SnippetWorker:
+    """Handle on a snippet_worker.py process holding one request's dataset.
+
+    Each snippet runs in a child forked from the worker, so a timed-out or
+    cancelled snippet is killed while the loaded data stays shared.
+    """
+
+    def __init__(self, data_path: str, folder: str, owner: str = None, priority: int = 0):
+        self.data_path = data_path
+        self.folder = folder
+        self.owner = owner
+        self.priority = priority
+        self._process = None
+        self._reader = None
+        self._jobs = {}
+        self._ids = itertools.count(1)
+
+    async def start(self):
+        """Spawn the worker and wait until the dataset is loaded"""
+        # Worker and snippet stderr go to a log file so a chatty snippet can't block on a full pipe
+        log_path = os.path.join(self.folder, "snippet_worker.log")
+        async with scheduler.slot("exec", self.owner, self.priority):
+            with open(log_path, "wb") as log:
+                self._process = await asyncio.create_subprocess_exec(
+                    sys.executable, WORKER_SCRIPT, self.data_path, self.folder,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=log,
+                )
+            try:
+                line = await self._process.stdout.readline()
+                if not line or not json.loads(line).get("ready"):
+                    with open(log_path, "r") as log:
+                        raise RuntimeError(f"Worker failed to load {self.data_path}:\n{log.read()}")
+            except BaseException:
+                await self.close()
+                raise
+        self._reader = asyncio.create_task(self._read_events())
+
+    async def _read_events(self):
+        async for line in self._process.stdout:
+            event = json.loads(line)
+            job = self._jobs.get(event["id"])
+            if job is None:
+                continue
+            if "pid" in event:
+                job["pid"] = event["pid"]
+                if job["cancelled"]:
+                    # Cancelled before the fork was reported
+                    self._kill(job)
+            elif event.get("done"):
+                job["finished"] = True
+                job["error"] = event.get("error")
+                if not job["future"].done():
+                    job["future"].set_result(None)
+        # Worker died: fail whatever is still pending
+        for job in self._jobs.values():
+            if not job["future"].done():
+                job["future"].set_exception(RuntimeError("Snippet worker exited"))
+
+    @staticmethod
+    def _kill(job):
+        # Never signal a finished child: its pid may already be reused
+        if job["pid"] and not job["finished"]:
+            try:
+                os.kill(job["pid"], signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    async def run(self, code: str, libraries: List[str]) -> dict:
+        """Run one snippet against the shared `df` and return the `answer` it sets"""
+        install_result = await install_libraries(libraries, owner=self.owner, priority=self.priority)
+        if install_result is not None:
+            return install_result
+
+        job_id = next(self._ids)
+        job = {"future": asyncio.get_running_loop().create_future(), "pid": None, "cancelled": False, "finished": False, "error": None}
+        self._jobs[job_id] = job
+        try:
+            async with scheduler.slot("exec", self.owner, self.priority):
+                self._process.stdin.write((json.dumps({"id": job_id, "code": code}) + "\n").encode())
+                await self._process.stdin.drain()
+                await job["future"]
+        except asyncio.CancelledError:
+            # Timeout or client gone: kill the child so it stops using CPU
+            job["cancelled"] = True
+            job["future"].cancel()
+            self._kill(job)
+            raise
+        except Exception:
+            return {"code": 0, "output": f"❌ Error during code execution:\n{traceback.format_exc()}"}
+
+        if job["error"]:
+            return {"code": 0, "output": f"❌ {job['error']}"}
+        with open(os.path.join(self.folder, "answers", f"{job_id}.json"), "r") as f:
+            return json.load(f)
+
+    async def close(self):
+        for job in self._jobs.values():
+            self._kill(job)
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        if self._reader is not None:
+            self._reader.cancel()
+
+
+async def run_python_code(code: str, libraries: List[str], folder: str = "uploads", owner: str = None, priority: int = 0) -> dict:
+    # Step 1: Install all required libraries first
+    install_result = await install_libraries(libraries, owner=owner, priority=priority)
+    if install_result is not None:
+        return install_result
 
-    # Step 2: Execute the code after installation
+    # Step 2: Execute the code after installation, in its own interpreter so
+    # concurrent scripts don't share state (e.g. pyplot) and can be killed
     try:
-        execute_code()
-        return {"code": 1, "output": "✅ Code executed successfully after installing libraries."}
+        async with scheduler.slot("exec", owner, priority):
+            returncode, stdout, stderr = await _run_process([sys.executable, "-"], input_data=code.encode())
+    except Exception:
+        return {"code": 0, "output": f"❌ Error during code execution:\n{traceback.format_exc()}" }
 
-    except Exception as e:
-        return {"code": 0, "output": f"❌ Error during code execution:\n{traceback.format_exc()}" }
\ No newline at end of file
+    if stdout:
+        print(stdout)
+    if returncode != 0:
+        return {"code": 0, "output": f"❌ Error during code execution:\n{stderr}" }
+    return {"code": 1, "output": "✅ Code executed successfully after installing libraries."}
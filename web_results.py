@@ -0,0 +1,147 @@
+import html
+import json
+import os
+import time
+from collections import OrderedDict, deque
+
+
+class ResultCache:
+    """Small in-memory LRU cache of rendered result HTML keyed by answer mode and question text"""
+
+    def __init__(self, max_items=128, ttl=3600):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question, mode):
+        # Collapse whitespace so trivially reformatted questions share an entry
+        return mode, " ".join(question.split())
+
+    def get(self, question, mode):
+        key = self.key(question, mode)
+        entry = self._items.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self._items.pop(key, None)
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, question, mode, rendered):
+        key = self.key(question, mode)
+        self._items[key] = (time.monotonic(), rendered)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self._items), "max_items": self.max_items, "hits": self.hits, "misses": self.misses}
+
+
+class WebTimings:
+    """Rolling time-to-first-byte and time-to-result samples for /web-api.
+
+    Cache hits are kept apart so they don't hide pipeline latency.
+    """
+
+    def __init__(self, maxlen=500):
+        self.ttfb = deque(maxlen=maxlen)
+        self.ttr = deque(maxlen=maxlen)
+        self.cached = deque(maxlen=maxlen)
+        self.active = 0
+        self.peak_active = 0
+
+    def start(self):
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def finish(self):
+        self.active -= 1
+
+    @staticmethod
+    def _summary(samples):
+        values = sorted(samples)
+        if not values:
+            return {"samples": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "samples": len(values),
+            "p50": round(values[len(values) // 2], 4),
+            "p95": round(values[min(len(values) - 1, int(0.95 * len(values)))], 4),
+            "max": round(values[-1], 4),
+        }
+
+    def stats(self):
+        return {
+            "active_sessions": self.active,
+            "peak_sessions": self.peak_active,
+            "time_to_first_byte": self._summary(self.ttfb),
+            "time_to_result": self._summary(self.ttr),
+            "cache_hit_time": self._summary(self.cached),
+        }
+
+
+result_cache = ResultCache(
+    max_items=int(os.getenv("WEB_CACHE_SIZE", "128")),
+    ttl=int(os.getenv("WEB_CACHE_TTL", "3600")),
+)
+web_timings = WebTimings()
+
+
+PAGE_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <title>🤖 Data Analyst Agent</title>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+<body>
+    <h1>🤖 Data Analyst Agent</h1>
+    <p><b>Question:</b> {question}</p>
+    <ul id="progress">
+"""
+
+PAGE_TAIL = """
+    <p><a href="/">Ask another question</a></p>
+</body>
+</html>
+"""
+
+
+def render_head(question):
+    # Browsers hold back rendering of tiny chunks, so pad the first one
+    return PAGE_HEAD.format(question=html.escape(question)) + "<!--" + " " * 1024 + "-->\n"
+
+
+def render_progress(message):
+    return f"        <li>{html.escape(message)}</li>\n"
+
+
+def _render_value(value):
+    if isinstance(value, str) and value.startswith("data:image/"):
+        return f'<img src="{html.escape(value)}" style="max-width:100%">'
+    if isinstance(value, str) and value.startswith("iVBORw0KGgo"):
+        # Bare base64 PNG, as requested by the analysis prompt
+        return f'<img src="data:image/png;base64,{html.escape(value)}" style="max-width:100%">'
+    return f"<pre>{html.escape(json.dumps(value, indent=2, default=str))}</pre>"
+
+
+def render_result(content, ok):
+    """Render the pipeline payload as an HTML fragment (closes the progress list)"""
+    parts = ["    </ul>\n", f"    <h2>{'Result' if ok else 'Analysis failed'}</h2>\n"]
+    if isinstance(content, dict):
+        parts.append("    <dl>\n")
+        for name, value in content.items():
+            parts.append(f"        <dt><b>{html.escape(str(name))}</b></dt><dd>{_render_value(value)}</dd>\n")
+        parts.append("    </dl>\n")
+    elif isinstance(content, list):
+        parts.append("    <ol>\n")
+        for value in content:
+            parts.append(f"        <li>{_render_value(value)}</li>\n")
+        parts.append("    </ol>\n")
+    else:
+        parts.append(f"    {_render_value(content)}\n")
+    return "".join(parts)